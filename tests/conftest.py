@@ -1,3 +1,4 @@
+import brownie
 import pytest
 from brownie import (
     BTCBurner,
@@ -8,8 +9,6 @@ from brownie import (
     UnderlyingBurner,
     USDNBurner,
     YBurner,
-    compile_source,
-    convert,
 )
 from brownie_tokens import ERC20
 
@@ -17,6 +16,8 @@ YEAR = 365 * 86400
 INITIAL_RATE = 274_815_283
 YEAR_1_SUPPLY = INITIAL_RATE * 10 ** 18 // YEAR * YEAR
 INITIAL_SUPPLY = 1_303_030_303
+Q = 1 / 2 ** 0.25
+INV_ONE_MINUS_Q = 1 / (1 - Q)
 
 
 def approx(a, b, precision=1e-10):
@@ -26,30 +27,111 @@ def approx(a, b, precision=1e-10):
 
 
 def pack_values(values):
-    packed = b"".join(i.to_bytes(1, "big") for i in values)
-    padded = packed + bytes(32 - len(values))
-    return padded
+    assert len(values) <= 32
+    return bytes(values).ljust(32, b"\x00")
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "no_fn_isolation: only revert the chain between modules, not between tests"
+    )
+
+
+# set while a module is running, between the snapshot and revert of `module_isolation`
+_module_snapshot_active = False
+# set on Ctrl-C, so the chain is left as-is for inspection (as brownie does)
+_interrupted = False
+
+
+def pytest_keyboard_interrupt(excinfo):
+    global _interrupted
+    _interrupted = True
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_fixture_setup(fixturedef, request):
+    if fixturedef.scope != "session" or not _module_snapshot_active:
+        yield
+        return
+
+    height = brownie.chain.height
+    yield
+    if brownie.chain.height != height:
+        # the changes are reverted at the end of the module, but pytest would keep
+        # returning the cached result - discard it and fail instead
+        fixturedef.finish(request)
+        pytest.fail(
+            f"Session fixture '{fixturedef.argname}' modified the chain after the module "
+            "snapshot was taken. Request it from the first test in the module, or make "
+            "it module-scoped.",
+            pytrace=False,
+        )
+
+
+@pytest.fixture(scope="module")
+def module_isolation(chain, web3):
+    # brownie's `module_isolation` resets the chain to genesis, which would wipe the
+    # session-scoped contracts below. Instead, revert to the state at the start of the
+    # module. Brownie pins `module_isolation` to run right after the session fixtures
+    # (`_make_fixture_execute_first`), so session fixtures requested by the first test
+    # in a module are kept. Any session fixture that changes the chain must be requested
+    # there, or be module-scoped - `pytest_fixture_setup` above fails when one is first
+    # set up later in the module.
+    # `chain.snapshot` only has a single slot, which `fn_isolation` uses, so the module
+    # snapshot is taken directly on the node.
+    global _module_snapshot_active
+
+    snapshot_id = web3.provider.make_request("evm_snapshot", [])["result"]
+    _module_snapshot_active = True
+    yield
+    _module_snapshot_active = False
+    if not _interrupted:
+        web3.provider.make_request("evm_revert", [snapshot_id])
+        # resync brownie's view of the chain time with the reverted node
+        chain.sleep(0)
 
 
 @pytest.fixture(autouse=True)
-def isolation_setup(fn_isolation):
-    pass
+def isolation_setup(request, module_isolation):
+    # modules whose tests do not depend on each other's state can opt out of
+    # the per-test snapshot/revert and only be isolated at the module level
+    if request.node.get_closest_marker("no_fn_isolation") is None:
+        request.getfixturevalue("fn_isolation")
 
 
 # helper functions as fixtures
 
 
+@pytest.fixture(scope="session")
+def multicall(alice):
+    # brownie deploys the aggregator on first use and remembers its address, which goes
+    # stale once the chain reverts past that deployment - so deploy it ahead of any snapshot.
+    # the block number is also remembered across uses, so pin it to the head on every use
+    brownie.multicall.deploy({"from": alice})
+    yield lambda: brownie.multicall(block_identifier=brownie.chain.height)
+
+
 @pytest.fixture(scope="module")
 def theoretical_supply(chain, token):
+    # `start_epoch_time` advances by exactly one year each time `mining_epoch` is
+    # incremented, so it can be derived from the epoch instead of being queried
+    epoch_time_offset = token.start_epoch_time() - token.mining_epoch() * YEAR
+
+    # the epoch can only change in a new block, so query it once per block. blocks are
+    # keyed by hash - after a revert, the number of a newly mined block is reused
+    epochs = {}
+
     def _fn():
-        epoch = token.mining_epoch()
-        q = 1 / 2 ** 0.25
+        block = chain[-1]
+        if block.hash not in epochs:
+            epochs[block.hash] = token.mining_epoch()
+        epoch = epochs[block.hash]
+        start_epoch_time = epoch_time_offset + epoch * YEAR
+
         S = INITIAL_SUPPLY * 10 ** 18
         if epoch > 0:
-            S += int(YEAR_1_SUPPLY * (1 - q ** epoch) / (1 - q))
-        S += int(YEAR_1_SUPPLY // YEAR * q ** epoch) * (
-            chain[-1].timestamp - token.start_epoch_time()
-        )
+            S += int(YEAR_1_SUPPLY * (1 - Q ** epoch) * INV_ONE_MINUS_Q)
+        S += int(YEAR_1_SUPPLY // YEAR * Q ** epoch) * (block.timestamp - start_epoch_time)
         return S
 
     yield _fn
@@ -82,7 +164,7 @@ def whale_amount():
     yield 10**22
 
 @pytest.fixture
-def whale(accounts, token, whale_amount):
+def whale(accounts):
     yield accounts[1]
 
 @pytest.fixture
@@ -96,11 +178,11 @@ def create_token(ERC20CRV, accounts):
 
 # core contracts
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def token(ERC20CRV, accounts):
     yield ERC20CRV.deploy("Curve DAO Token", "CRV", 18, {"from": accounts[0]})
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def voting_escrow(VotingEscrow, accounts, token):
     yield VotingEscrow.deploy(
         token, "Voting-escrowed CRV", "veCRV", accounts[0], {"from": accounts[0]}
@@ -112,27 +194,22 @@ def ve_rbn_rewards(VeRBNRewards, accounts, voting_escrow, token):
     voting_escrow.set_reward_pool(ve_rbn_rewards)
     yield ve_rbn_rewards
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def delegation_proxy(DelegationProxy, accounts, voting_escrow):
     yield DelegationProxy.deploy("0x0000000000000000000000000000000000000000", voting_escrow, accounts[0], accounts[0], {"from": accounts[0]})
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def gauge_controller(GaugeController, accounts, token, delegation_proxy, voting_escrow):
     yield GaugeController.deploy(token, voting_escrow, delegation_proxy, accounts[0], {"from": accounts[0]})
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def minter(Minter, accounts, gauge_controller, token):
     yield Minter.deploy(token, gauge_controller, accounts[0], accounts[0], {"from": accounts[0]})
 
 
-@pytest.fixture(scope="module")
-def crypto_pool_proxy(alice, CryptoPoolProxy):
-    return CryptoPoolProxy.deploy(alice, alice, alice, {"from": alice})
-
-
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def pool_proxy(PoolProxy, accounts):
     yield PoolProxy.deploy(accounts[0], accounts[0], accounts[0], {"from": accounts[0]})
 
@@ -172,12 +249,8 @@ def gauge_v4(LiquidityGaugeV4, alice, mock_lp_token, minter):
     yield LiquidityGaugeV4.deploy(mock_lp_token, minter, alice, {"from": alice})
 
 @pytest.fixture(scope="module")
-def gauge_v5(LiquidityGaugeV5, alice, token, mock_lp_token, minter):
-    source = LiquidityGaugeV5._build["source"].replace(
-        "0xD533a949740bb3306d119CC777fa900bA034cd52", token.address, 1
-    )
-    NewLiquidityGaugeV5 = compile_source(source, vyper_version="0.3.1").Vyper
-    yield NewLiquidityGaugeV5.deploy(mock_lp_token, minter, alice, {"from": alice})
+def gauge_v5(LiquidityGaugeV5, alice, mock_lp_token, minter):
+    yield LiquidityGaugeV5.deploy(mock_lp_token, minter, alice, {"from": alice})
 
 @pytest.fixture(scope="module")
 def rewards_only_gauge(RewardsOnlyGauge, alice, mock_lp_token):
@@ -249,12 +322,12 @@ def vesting(VestingEscrow, accounts, coin_a, start_time, end_time):
     yield contract
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def vesting_target(VestingEscrowSimple, accounts):
     yield VestingEscrowSimple.deploy({"from": accounts[0]})
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def vesting_factory(VestingEscrowFactory, accounts, vesting_target):
     yield VestingEscrowFactory.deploy(vesting_target, accounts[0], {"from": accounts[0]})
 
@@ -276,26 +349,32 @@ def vesting_simple(VestingEscrowSimple, accounts, vesting_factory, coin_a, start
 
 # parametrized burner fixture
 
+BURNERS = [
+    BTCBurner,
+    CBurner,
+    ETHBurner,
+    LPBurner,
+    MetaBurner,
+    UnderlyingBurner,
+    USDNBurner,
+    YBurner,
+]
+
 
-@pytest.fixture(
-    scope="module",
-    params=[
-        BTCBurner,
-        CBurner,
-        ETHBurner,
-        LPBurner,
-        MetaBurner,
-        UnderlyingBurner,
-        USDNBurner,
-        YBurner,
-    ],
-)
-def burner(alice, bob, receiver, pool_proxy, request):
-    Burner = request.param
+@pytest.fixture(scope="session")
+def burners(alice, bob, receiver, pool_proxy):
     args = (pool_proxy, receiver, receiver, alice, bob, {"from": alice})
-    idx = len(Burner.deploy.abi["inputs"]) + 1
+    contracts = {}
+    for Burner in BURNERS:
+        idx = len(Burner.deploy.abi["inputs"]) + 1
+        contracts[Burner._name] = Burner.deploy(*args[-idx:])
+
+    yield contracts
 
-    yield Burner.deploy(*args[-idx:])
+
+@pytest.fixture(scope="module", params=BURNERS)
+def burner(burners, request):
+    yield burners[request.param._name]
 
 
 # testing contracts
@@ -343,84 +422,3 @@ def fee_distributor(FeeDistributor, voting_escrow, ve_rbn_rewards, accounts, wet
         )
 
     yield f
-
-
-@pytest.fixture(scope="module")
-def crypto_coins(coin_a, coin_b, coin_c):
-    return [coin_a, coin_b, coin_c]
-
-
-@pytest.fixture(scope="session")
-def crypto_project(pm):
-    return pm("curvefi/curve-crypto-contract@1.0.0")
-
-
-@pytest.fixture(scope="module")
-def crypto_lp_token(alice, crypto_project):
-    return crypto_project.CurveTokenV4.deploy("Mock Crypto LP Token", "crvMock", {"from": alice})
-
-
-@pytest.fixture(scope="module")
-def crypto_math(alice, crypto_project):
-    return crypto_project.CurveCryptoMath3.deploy({"from": alice})
-
-
-@pytest.fixture(scope="module")
-def crypto_views(alice, crypto_project, crypto_math, crypto_coins):
-    source: str = crypto_project.CurveCryptoViews3._build["source"]
-    for idx, coin in enumerate(crypto_coins):
-        new_value = 10 ** (18 - coin.decimals())
-        source = source.replace(f"1,#{idx}", f"{new_value},")
-    Views = compile_source(source, vyper_version="0.2.12").Vyper
-    return Views.deploy(crypto_math, {"from": alice})
-
-
-@pytest.fixture(scope="session")
-def crypto_initial_prices():
-    # p = requests.get(
-    #     "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,ethereum&vs_currencies=usd"
-    # ).json()
-    # return tuple(int(p[cur]["usd"] * 1e18) for cur in ["bitcoin", "ethereum"])
-    return (39362000000000003670016, 2493090000000000196608)
-
-
-@pytest.fixture(scope="module")
-def crypto_pool(
-    alice,
-    crypto_project,
-    crypto_math,
-    crypto_lp_token,
-    crypto_views,
-    crypto_coins,
-    crypto_initial_prices,
-):
-    # taken from curvefi/curve-crypto-contract
-    keys = [0, 1, 2, 16, 17, 18, "1,#0", "1,#1", "1,#2"]
-    values = (
-        [crypto_math.address, crypto_lp_token.address, crypto_views.address]
-        + [coin.address for coin in crypto_coins]
-        + [f"{10 ** (18 - coin.decimals())}," for coin in crypto_coins]
-    )
-    source = crypto_project.CurveCryptoSwap._build["source"]
-    for k, v in zip(keys, values):
-        if isinstance(k, int):
-            k = convert.to_address(convert.to_bytes(k, "bytes20"))
-        source.replace(k, v)
-
-    CryptoPool = compile_source(source, vyper_version="0.2.12").Vyper
-    swap = CryptoPool.deploy(
-        alice,
-        135 * 3 ** 3,  # A
-        int(7e-5 * 1e18),  # gamma
-        int(4e-4 * 1e10),  # mid_fee
-        int(4e-3 * 1e10),  # out_fee
-        int(0.0028 * 1e18),  # price_threshold
-        int(0.01 * 1e18),  # fee_gamma
-        int(0.0015 * 1e18),  # adjustment_step
-        0,  # admin_fee
-        600,  # ma_half_time
-        crypto_initial_prices,
-        {"from": alice},
-    )
-    crypto_lp_token.set_minter(swap, {"from": alice})
-    return swap
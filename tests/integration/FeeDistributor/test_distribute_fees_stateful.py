@@ -1,7 +1,9 @@
 from collections import defaultdict
 
+import pytest
 from brownie import chain
 from brownie.test import strategy
+from hypothesis import HealthCheck, Phase
 
 WEEK = 86400 * 7
 YEAR = 86400 * 365
@@ -11,14 +13,15 @@ class StateMachine:
 
     st_acct = strategy("address", length=5)
     st_weeks = strategy("uint256", min_value=1, max_value=12)
-    st_amount = strategy("decimal", min_value=1, max_value=100, places=3)
+    st_amount = strategy("uint256", min_value=10 ** 18, max_value=100 * 10 ** 18)
     st_time = strategy("uint256", min_value=0, max_value=86400 * 3)
 
-    def __init__(cls, distributor, accounts, voting_escrow, fee_coin):
+    def __init__(cls, distributor, accounts, voting_escrow, fee_coin, multicall):
         cls.distributor = distributor
         cls.accounts = accounts
         cls.voting_escrow = voting_escrow
         cls.fee_coin = fee_coin
+        cls.multicall = multicall
 
     def setup(self):
         self.locked_until = {self.accounts[0]: self.voting_escrow.locked__end(self.accounts[0])}
@@ -26,6 +29,12 @@ class StateMachine:
         self.user_claims = defaultdict(dict)
         self.total_fees = 10 ** 18
 
+    def _sleep(self, st_time):
+        # every rule acts on the chain right after sleeping, so sleeps cannot be deferred
+        # across rules - but hypothesis often draws zero, which needs no RPC call at all
+        if st_time:
+            chain.sleep(st_time)
+
     def _check_active_lock(self, st_acct):
         # check if `st_acct` has an active lock
         if st_acct not in self.locked_until:
@@ -65,18 +74,18 @@ class StateMachine:
         st_acct : Account
             Account to lock tokens for. If this account already has an active
             lock, the rule is skipped.
-        st_amount : decimal
+        st_amount : int
             Amount of tokens to lock.
         st_weeks : int
             Duration of lock, given in weeks.
         st_time : int
             Duration to sleep before action, in seconds.
         """
-        chain.sleep(st_time)
+        self._sleep(st_time)
 
         if not self._check_active_lock(st_acct):
             until = ((chain.time() // WEEK) + st_weeks) * WEEK
-            self.voting_escrow.create_lock(int(st_amount * 10 ** 18), until, {"from": st_acct})
+            self.voting_escrow.create_lock(st_amount, until, {"from": st_acct})
             self.locked_until[st_acct] = until
 
     def rule_extend_lock(self, st_acct, st_weeks, st_time):
@@ -93,7 +102,7 @@ class StateMachine:
         st_time : int
             Duration to sleep before action, in seconds.
         """
-        chain.sleep(st_time)
+        self._sleep(st_time)
 
         if self._check_active_lock(st_acct):
             until = ((self.locked_until[st_acct] // WEEK) + st_weeks) * WEEK
@@ -111,15 +120,15 @@ class StateMachine:
         st_acct : Account
             Account to increase lock amount for. If this account does not have an
             active lock, the rule is skipped.
-        st_amount : decimal
+        st_amount : int
             Amount of tokens to add to lock.
         st_time : int
             Duration to sleep before action, in seconds.
         """
-        chain.sleep(st_time)
+        self._sleep(st_time)
 
         if self._check_active_lock(st_acct):
-            self.voting_escrow.increase_amount(int(st_amount * 10 ** 18), {"from": st_acct})
+            self.voting_escrow.increase_amount(st_amount, {"from": st_acct})
 
     def rule_claim_fees(self, st_acct, st_time):
         """
@@ -132,7 +141,7 @@ class StateMachine:
         st_time : int
             Duration to sleep before action, in seconds.
         """
-        chain.sleep(st_time)
+        self._sleep(st_time)
 
         claimed = self.fee_coin.balanceOf(st_acct)
 
@@ -153,22 +162,21 @@ class StateMachine:
 
         Arguments
         ---------
-        st_amount : decimal
+        st_amount : int
             Amount of fee tokens to add to the distributor.
         st_time : int
             Duration to sleep before action, in seconds.
         """
-        chain.sleep(st_time)
+        self._sleep(st_time)
 
-        amount = int(st_amount * 10 ** 18)
-        tx = self.fee_coin._mint_for_testing(self.distributor.address, amount)
+        tx = self.fee_coin._mint_for_testing(self.distributor.address, st_amount)
 
         if not self.distributor.can_checkpoint_token():
             self.distributor.toggle_allow_checkpoint_token()
             self.distributor.checkpoint_token()
 
-        self.fees[tx.timestamp] = amount
-        self.total_fees += amount
+        self.fees[tx.timestamp] = st_amount
+        self.total_fees += st_amount
 
     def rule_transfer_fees_without_checkpoint(self, st_amount, st_time):
         """
@@ -176,18 +184,17 @@ class StateMachine:
 
         Arguments
         ---------
-        st_amount : decimal
+        st_amount : int
             Amount of fee tokens to add to the distributor.
         st_time : int
             Duration to sleep before action, in seconds.
         """
-        chain.sleep(st_time)
+        self._sleep(st_time)
 
-        amount = int(st_amount * 10 ** 18)
-        tx = self.fee_coin._mint_for_testing(self.distributor.address, amount)
+        tx = self.fee_coin._mint_for_testing(self.distributor.address, st_amount)
 
-        self.fees[tx.timestamp] = amount
-        self.total_fees += amount
+        self.fees[tx.timestamp] = st_amount
+        self.total_fees += st_amount
 
     def teardown(self):
         """
@@ -195,7 +202,7 @@ class StateMachine:
         """
         if not self.distributor.can_checkpoint_token():
             # if no token checkpoint occured, add 100,000 tokens prior to teardown
-            self.rule_transfer_fees(100000, 0)
+            self.rule_transfer_fees(100000 * 10 ** 18, 0)
 
         # Need two checkpoints to get tokens fully distributed
         # Because tokens for current week are obtained in the next week
@@ -209,14 +216,22 @@ class StateMachine:
 
         t0 = self.distributor.start_time()
         t1 = chain[-1].timestamp // WEEK * WEEK
+        weeks = range(t0, t1 + WEEK, WEEK)
+
+        # batch every view call into a single request. results are only read after
+        # leaving the context, as reading one flushes the queue of pending calls
+        with self.multicall():
+            tokens_per_week = [self.distributor.tokens_per_week(w) for w in weeks]
+            ve_supply = [self.distributor.ve_supply(w) for w in weeks]
+            ve_for_at = {
+                acct: [self.distributor.ve_for_at(acct, w) for w in weeks] for acct in self.accounts
+            }
+
         tokens_per_user_per_week = {
             acct: [
-                self.distributor.tokens_per_week(w)
-                * self.distributor.ve_for_at(acct, w)
-                // self.distributor.ve_supply(w)
-                for w in range(t0, t1 + WEEK, WEEK)
+                tokens_per_week[i] * ve_for_at[acct][i] // ve_supply[i] for i in range(len(weeks))
             ]
-            for acct in self.accounts[:5]
+            for acct in self.accounts
         }
 
         for acct in self.accounts:
@@ -225,24 +240,40 @@ class StateMachine:
         assert self.fee_coin.balanceOf(self.distributor) < 100
 
 
-def test_stateful(state_machine, accounts, voting_escrow, ve_rbn_rewards, fee_distributor, weth, token):
-    for i in range(5):
-        # ensure accounts[:5] all have tokens that may be locked
-        token.approve(voting_escrow, 2 ** 256 - 1, {"from": accounts[i]})
-        token.transfer(accounts[i], 10 ** 18 * 10000000, {"from": accounts[0]})
+@pytest.fixture(scope="module")
+def distributor(accounts, voting_escrow, ve_rbn_rewards, fee_distributor, token):
+    # ensure accounts[:5] all have tokens that may be locked - accounts[0] already
+    # holds the initial supply, so it only needs the approval
+    for acct in accounts[:5]:
+        token.approve(voting_escrow, 2 ** 256 - 1, {"from": acct})
+    for acct in accounts[1:5]:
+        token.transfer(acct, 10 ** 18 * 10000000, {"from": accounts[0]})
 
     # accounts[0] locks 10,000,000 tokens for 2 years - longer than the maximum duration of the test
     voting_escrow.create_lock(10 ** 18 * 10000000, chain.time() + YEAR, {"from": accounts[0]})
 
     # a week later we deploy the fee distributor
     chain.sleep(WEEK)
-    distributor = fee_distributor()
+    yield fee_distributor()
+
 
+def test_stateful(state_machine, accounts, voting_escrow, distributor, weth, multicall):
+    # `state_machine` snapshots the chain once the setup above is done, and reverts
+    # to that snapshot before each example rather than repeating the setup
     state_machine(
         StateMachine,
         distributor,
         accounts[:5],
         voting_escrow,
         weth,
-        settings={"stateful_step_count": 30},
+        multicall,
+        settings={
+            "stateful_step_count": 30,
+            "max_examples": 20,
+            # every replayed step hits the chain, so shrinking a failure can take far longer
+            # than the run that found it
+            "phases": [Phase.explicit, Phase.reuse, Phase.generate],
+            "deadline": None,
+            "suppress_health_check": [HealthCheck.too_slow],
+        },
     )
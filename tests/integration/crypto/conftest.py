@@ -0,0 +1,109 @@
+import re
+
+import pytest
+from brownie import compile_source, convert
+
+
+@pytest.fixture(scope="session")
+def compile_vyper():
+    # compiling a patched source is far more expensive than deploying it, and
+    # modules usually patch in identical values - so compile each source only once
+    containers = {}
+
+    def _fn(source, vyper_version):
+        key = (source, vyper_version)
+        if key not in containers:
+            containers[key] = compile_source(source, vyper_version=vyper_version).Vyper
+        return containers[key]
+
+    yield _fn
+
+
+@pytest.fixture(scope="module")
+def crypto_pool_proxy(alice, CryptoPoolProxy):
+    return CryptoPoolProxy.deploy(alice, alice, alice, {"from": alice})
+
+
+@pytest.fixture(scope="module")
+def crypto_coins(coin_a, coin_b, coin_c):
+    return [coin_a, coin_b, coin_c]
+
+
+@pytest.fixture(scope="session")
+def crypto_project(pm):
+    return pm("curvefi/curve-crypto-contract@1.0.0")
+
+
+@pytest.fixture(scope="module")
+def crypto_lp_token(alice, crypto_project):
+    return crypto_project.CurveTokenV4.deploy("Mock Crypto LP Token", "crvMock", {"from": alice})
+
+
+@pytest.fixture(scope="session")
+def crypto_math(alice, crypto_project):
+    return crypto_project.CurveCryptoMath3.deploy({"from": alice})
+
+
+@pytest.fixture(scope="module")
+def crypto_views(alice, crypto_project, compile_vyper, crypto_math, crypto_coins):
+    source: str = crypto_project.CurveCryptoViews3._build["source"]
+    for idx, coin in enumerate(crypto_coins):
+        new_value = 10 ** (18 - coin.decimals())
+        source = source.replace(f"1,#{idx}", f"{new_value},")
+    Views = compile_vyper(source, "0.2.12")
+    return Views.deploy(crypto_math, {"from": alice})
+
+
+@pytest.fixture(scope="session")
+def crypto_initial_prices():
+    # p = requests.get(
+    #     "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,ethereum&vs_currencies=usd"
+    # ).json()
+    # return tuple(int(p[cur]["usd"] * 1e18) for cur in ["bitcoin", "ethereum"])
+    return (39362000000000003670016, 2493090000000000196608)
+
+
+@pytest.fixture(scope="module")
+def crypto_pool(
+    alice,
+    crypto_project,
+    compile_vyper,
+    crypto_math,
+    crypto_lp_token,
+    crypto_views,
+    crypto_coins,
+    crypto_initial_prices,
+):
+    # taken from curvefi/curve-crypto-contract
+    keys = [0, 1, 2, 16, 17, 18, "1,#0", "1,#1", "1,#2"]
+    values = (
+        [crypto_math.address, crypto_lp_token.address, crypto_views.address]
+        + [coin.address for coin in crypto_coins]
+        + [f"{10 ** (18 - coin.decimals())}," for coin in crypto_coins]
+    )
+    replacements = {
+        convert.to_address(convert.to_bytes(k, "bytes20")) if isinstance(k, int) else k: v
+        for k, v in zip(keys, values)
+    }
+    pattern = re.compile("|".join(map(re.escape, replacements)))
+    source = pattern.sub(
+        lambda match: replacements[match.group(0)], crypto_project.CurveCryptoSwap._build["source"]
+    )
+
+    CryptoPool = compile_vyper(source, "0.2.12")
+    swap = CryptoPool.deploy(
+        alice,
+        135 * 3 ** 3,  # A
+        int(7e-5 * 1e18),  # gamma
+        int(4e-4 * 1e10),  # mid_fee
+        int(4e-3 * 1e10),  # out_fee
+        int(0.0028 * 1e18),  # price_threshold
+        int(0.01 * 1e18),  # fee_gamma
+        int(0.0015 * 1e18),  # adjustment_step
+        0,  # admin_fee
+        600,  # ma_half_time
+        crypto_initial_prices,
+        {"from": alice},
+    )
+    crypto_lp_token.set_minter(swap, {"from": alice})
+    return swap
@@ -1,5 +1,8 @@
 import pytest
 
+# test_initial_approval_is_zero[0] must run before test_approve_self sets that allowance
+pytestmark = pytest.mark.no_fn_isolation
+
 
 @pytest.mark.parametrize("idx", range(5))
 def test_initial_approval_is_zero(gauge_v5, accounts, idx):